@@ -96,6 +96,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Кэш общий для всех процессов, иначе сброс кэша поиска при изменении статьи
+# увидит только процесс, сохранивший статью. Таблицу создает
+# python manage.py createcachetable
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'blog_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -145,3 +159,17 @@ EMAIL_POR = 587
 EMAIL_USE_TSL = True
 
 SITE_ID = 1
+
+# Поиск по блогу: размер страницы, максимум результатов и время жизни кэша
+# (в секундах).
+BLOG_SEARCH_RESULTS_PER_PAGE = 10
+BLOG_SEARCH_RESULTS_LIMIT = 100
+BLOG_SEARCH_CACHE_TIMEOUT = 60 * 15
+
+# Счетчики просмотров (blog.counters): каждый процесс записывает просмотры
+# в базу раз в BLOG_VIEWS_FLUSH_INTERVAL секунд или после
+# BLOG_VIEWS_MAX_PENDING просмотров. При падении процесс теряет не больше
+# BLOG_VIEWS_MAX_PENDING просмотров, N процессов - до N раз больше.
+BLOG_VIEWS_FLUSH_INTERVAL = 30
+BLOG_VIEWS_MAX_PENDING = 100
+BLOG_MOST_VIEWED_CACHE_TIMEOUT = 60 * 5
@@ -0,0 +1,130 @@
+"""
+Счетчики просмотров статей.
+
+UPDATE счетчика на каждый просмотр блокирует строку популярной статьи
+для всех одновременных запросов. Поэтому просмотры копятся в памяти
+процесса и записываются в базу одним запросом INSERT ... ON CONFLICT
+каждые BLOG_VIEWS_FLUSH_INTERVAL секунд (фоновым потоком) или сразу,
+как только накопилось BLOG_VIEWS_MAX_PENDING просмотров.
+
+Буфер у каждого процесса свой: при аварийном завершении процесс теряет
+не больше BLOG_VIEWS_MAX_PENDING просмотров, набранных за последние
+BLOG_VIEWS_FLUSH_INTERVAL секунд, а N процессов - до N раз больше.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+
+from .models import Post, PostViewCount
+
+
+FLUSH_INTERVAL = getattr(settings, 'BLOG_VIEWS_FLUSH_INTERVAL', 30)
+MAX_PENDING = getattr(settings, 'BLOG_VIEWS_MAX_PENDING', 100)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = Counter()
+_pending_total = 0
+# Процесс, в котором запущен поток записи. После fork поток нужно запустить
+# заново, а унаследованный буфер принадлежит родителю.
+_flusher_pid = None
+_stopped = threading.Event()
+
+
+def record_view(post_id):
+    """ Учитываем просмотр статьи. """
+    global _pending_total, _flusher_pid
+    if not getattr(settings, 'BLOG_VIEWS_ENABLED', True):
+        return
+    with _lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            _pending.clear()
+            _pending_total = 0
+            _start_flusher()
+        _pending[post_id] += 1
+        _pending_total += 1
+        flush_due = _pending_total >= MAX_PENDING
+    if flush_due:
+        flush()
+
+
+def _start_flusher():
+    """ Запускаем фоновый поток периодической записи в текущем процессе. """
+    threading.Thread(target=_flush_periodically, daemon=True).start()
+
+
+def _flush_periodically():
+    while not _stopped.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception:
+            logger.exception('Failed to flush post views')
+        finally:
+            # Не держим соединение с базой между записями.
+            connection.close()
+
+
+def flush():
+    """ Записываем накопленные просмотры в базу одним запросом. """
+    global _pending, _pending_total
+    with _lock:
+        pending, _pending = _pending, Counter()
+        _pending_total = 0
+    if not pending:
+        return
+
+    # Сортировка по id задает одинаковый порядок блокировок во всех
+    # процессах.
+    rows = sorted(pending.items())
+    try:
+        _write(rows)
+    except DatabaseError:
+        lost = sum(pending.values())
+        with _lock:
+            # Возвращаем просмотры в буфер, только если он не превысит
+            # MAX_PENDING, иначе граница потерь перестанет соблюдаться.
+            requeued = _pending_total + lost <= MAX_PENDING
+            if requeued:
+                _pending.update(pending)
+                _pending_total += lost
+        if requeued:
+            logger.exception('Failed to flush post views, %d views will be '
+                             'retried', lost)
+        else:
+            logger.exception('Failed to flush post views, %d views dropped',
+                             lost)
+
+
+def _write(rows):
+    """ Прибавляем просмотры [(post_id, views), ...] к счетчикам в базе. """
+    quote = connection.ops.quote_name
+    table = quote(PostViewCount._meta.db_table)
+    values = ', '.join(['(%s, %s)'] * len(rows))
+    # Статьи, удаленные после просмотра, пропускаем.
+    sql = f'INSERT INTO {table} (post_id, total) ' \
+        f'SELECT v.post_id, v.total FROM (VALUES {values}) ' \
+        f'AS v (post_id, total) ' \
+        f'WHERE EXISTS (SELECT 1 FROM {quote(Post._meta.db_table)} p ' \
+        f'WHERE p.id = v.post_id) ' \
+        f'ON CONFLICT (post_id) ' \
+        f'DO UPDATE SET total = {table}.total + EXCLUDED.total'
+    # Ошибка не должна сломать транзакцию вызывающего кода.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+
+
+def _shutdown():
+    _stopped.set()
+    flush()
+
+
+# Не теряем накопленное при штатной остановке процесса.
+atexit.register(_shutdown)
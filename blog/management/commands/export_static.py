@@ -0,0 +1,203 @@
+"""
+Экспорт опубликованного блога в статические файлы для веб-сервера.
+
+    python manage.py export_static build/
+    python manage.py export_static build/ --incremental --jobs 4
+
+URL /blog/2020/8/8/slug/ сохраняется в build/blog/2020/8/8/slug/index.html,
+рядом кладется сжатая копия index.html.gz (в nginx: gzip_static on).
+Лента сохраняется в blog/feed/index.html, ее тип (application/rss+xml)
+нужно указать в настройках веб-сервера.
+Страница ?page=N списка статей сохраняется как page-N.html в каталоге
+списка, веб-сервер должен отдавать ее сам, например:
+
+    try_files $uri/page-$arg_page.html $uri/index.html $uri =404;
+"""
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from blog.models import Post, PostArchive, archive_periods
+from blog.views import POSTS_PER_PAGE
+
+
+MANIFEST_NAME = '.export-manifest.json'
+
+# Клиент процесса-обработчика, создается в _init_worker.
+_client = None
+
+
+def _init_worker(host):
+    global _client
+    # Рендер страниц при экспорте не считается просмотром.
+    override_settings(BLOG_VIEWS_ENABLED=False).enable()
+    # Ошибка в представлении должна стать ответом 500, а не исключением,
+    # которое оборвет весь экспорт.
+    _client = Client(HTTP_HOST=host, raise_request_exception=False)
+
+
+def _url_to_path(output_dir, url):
+    """ Путь к файлу, в который сохраняется страница с данным URL. """
+    path, _, query = url.partition('?')
+    filename = path.lstrip('/')
+    if path.endswith('/'):
+        page = query.partition('page=')[2]
+        filename += f'page-{page}.html' if page else 'index.html'
+    return os.path.join(output_dir, filename)
+
+
+def _export_url(output_dir, url):
+    """ Рендерим страницу и сохраняем ее вместе со сжатой копией. """
+    response = _client.get(url)
+    filename = _url_to_path(output_dir, url)
+    if response.status_code == 404:
+        # Статья снята с публикации или тег больше не используется.
+        for path in (filename, filename + '.gz'):
+            if os.path.exists(path):
+                os.remove(path)
+        return url, response.status_code
+    if response.status_code != 200:
+        return url, response.status_code
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(response.content)
+    with gzip.open(filename + '.gz', 'wb', compresslevel=9) as f:
+        f.write(response.content)
+    return url, response.status_code
+
+
+def _changed_states(posts, previous, incremental):
+    """
+    Состояния статей, страницы которых нужно отрендерить заново. Прежние
+    состояния измененных и снятых с публикации статей тоже входят в список:
+    их старые URL вернут 404 и файлы будут удалены.
+    """
+    if incremental and previous:
+        changed = [state for post_id, state in posts.items()
+                   if previous.get(post_id) != state]
+    else:
+        changed = list(posts.values())
+    changed += [state for post_id, state in previous.items()
+                if posts.get(post_id) != state]
+    return changed
+
+
+def _paginated_urls(output_dir, url, count):
+    """
+    URL всех страниц списка из count статей. Сохраненные ранее страницы
+    за пределами списка удаляем.
+    """
+    num_pages = Paginator(range(count), POSTS_PER_PAGE).num_pages
+    list_dir = os.path.dirname(_url_to_path(output_dir, url))
+    for path in glob.glob(os.path.join(list_dir, 'page-*.html*')):
+        page = os.path.basename(path)[len('page-'):].split('.')[0]
+        if not page.isdigit() or int(page) > num_pages:
+            os.remove(path)
+    return [url] + [f'{url}?page={page}' for page in range(2, num_pages + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Renders the published blog to static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Re-render only posts updated since the last export and '
+                 'the list, tag and archive pages they appear on. '
+                 'The sidebar of other pages is not refreshed.')
+        parser.add_argument(
+            '--jobs', type=int, default=os.cpu_count(),
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host name for rendered requests, must be in ALLOWED_HOSTS.')
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1:
+            raise CommandError('--jobs must be at least 1.')
+        output_dir = options['output_dir']
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        previous = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                previous = json.load(f)['posts']
+
+        posts = {}
+        for post in Post.published.prefetch_related('tags'):
+            posts[str(post.id)] = {
+                'url': post.get_absolute_url(),
+                'updated': post.updated.isoformat(),
+                'tags': [tag.slug for tag in post.tags.all()],
+                'archives': [
+                    PostArchive(period=period, start=start).get_absolute_url()
+                    for period, start in archive_periods(post.publish)],
+            }
+
+        changed = _changed_states(posts, previous, options['incremental'])
+        urls = self._collect_urls(output_dir, changed)
+
+        # Соединение родительского процесса не должно попасть в потомков.
+        connections.close_all()
+        failed = []
+        # Потомки наследуют настроенный Django только при fork: при spawn
+        # модуль импортируется заново до django.setup().
+        fork = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=options['jobs'], mp_context=fork,
+                                 initializer=_init_worker,
+                                 initargs=(options['host'],)) as executor:
+            results = executor.map(_export_url, [output_dir] * len(urls),
+                                   urls)
+            for url, status in results:
+                if status == 200 and options['verbosity'] > 1:
+                    self.stdout.write(url)
+                elif status not in (200, 404):
+                    failed.append(f'{url} ({status})')
+        if failed:
+            raise CommandError('Failed to export: ' + ', '.join(failed))
+
+        with open(manifest_path, 'w') as f:
+            json.dump({'posts': posts}, f)
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(urls)} pages to {output_dir}'))
+
+    def _collect_urls(self, output_dir, changed):
+        """
+        URL страниц, которые нужно отрендерить заново: измененные статьи
+        и списки, в которые они входят, а также лента и карта сайта.
+        """
+        urls = [state['url'] for state in changed]
+        if changed:
+            published = Post.published.all()
+            count = published.count()
+            for url in (reverse('blog:post_list_cbv'),
+                        reverse('blog:post_list')):
+                urls += _paginated_urls(output_dir, url, count)
+
+            tags = {slug for state in changed for slug in state['tags']}
+            for slug in sorted(tags):
+                urls += _paginated_urls(
+                    output_dir,
+                    reverse('blog:post_list_by_tag', args=[slug]),
+                    published.filter(tags__slug=slug).count())
+
+            archive_counts = {archive.get_absolute_url(): archive.total_posts
+                              for archive in PostArchive.objects.all()}
+            archives = {url for state in changed for url in state['archives']}
+            for url in sorted(archives):
+                # Опустевший период вернет 404 и будет удален.
+                urls += _paginated_urls(output_dir, url,
+                                        archive_counts.get(url, 0))
+        urls += [reverse('blog:post_feed'),
+                 reverse('django.contrib.sitemaps.views.sitemap')]
+        return list(dict.fromkeys(urls))
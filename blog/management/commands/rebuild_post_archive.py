@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import PostArchive
+
+
+class Command(BaseCommand):
+    help = 'Recounts published posts per year, month and day.'
+
+    def handle(self, *args, **options):
+        PostArchive.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Archive rebuilt: {PostArchive.objects.count()} periods'))
@@ -0,0 +1,54 @@
+# Generated by Django 3.1 on 2026-10-19 07:00
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncYear, TruncMonth, TruncDay
+from django.utils import timezone
+
+
+def build_archive(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostArchive = apps.get_model('blog', 'PostArchive')
+    archives = []
+    for period, trunc in (('year', TruncYear), ('month', TruncMonth),
+                          ('day', TruncDay)):
+        rows = Post.objects.filter(status='published')\
+            .annotate(start=trunc('publish'))\
+            .values('start').annotate(total_posts=Count('id')).order_by()
+        archives.extend(
+            PostArchive(period=period,
+                        start=timezone.localtime(row['start']).date(),
+                        total_posts=row['total_posts'])
+            for row in rows)
+    PostArchive.objects.bulk_create(archives)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('year', 'Year'), ('month', 'Month'), ('day', 'Day')], max_length=5)),
+                ('start', models.DateField()),
+                ('total_posts', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('-start',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['slug', 'publish'], name='blog_post_slug_c84a29_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postarchive',
+            unique_together={('period', 'start')},
+        ),
+        migrations.RunPython(build_archive, migrations.RunPython.noop),
+    ]
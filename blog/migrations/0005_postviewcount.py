@@ -0,0 +1,21 @@
+# Generated by Django 3.1 on 2026-10-19 07:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewCount',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_count', serialize=False, to='blog.post')),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
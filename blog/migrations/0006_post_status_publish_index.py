@@ -0,0 +1,17 @@
+# Generated by Django 3.1 on 2026-10-19 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_postviewcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', 'publish'], name='blog_post_status_1d42f4_idx'),
+        ),
+    ]
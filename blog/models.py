@@ -1,4 +1,8 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction, connection
+from django.db.models import Count, F
+from django.db.models.functions import TruncYear, TruncMonth, TruncDay
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
@@ -35,6 +39,13 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-publish',)
+        indexes = [
+            # post_detail ищет статью по slug в диапазоне дат публикации.
+            models.Index(fields=('slug', 'publish')),
+            # Списки и архив выбирают опубликованные статьи за период
+            # и сортируют их по дате.
+            models.Index(fields=('status', 'publish')),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -60,3 +71,119 @@ class Comment(models.Model):
 
     def __str__(self) -> str:
         return f'Comment by {self.name} on {self.post}'
+
+
+def archive_periods(publish):
+    """
+    Год, месяц и день, в архив которых попадает статья, как пары
+    (period, start) в текущем часовом поясе.
+    """
+    date = timezone.localtime(publish).date()
+    return [('year', date.replace(month=1, day=1)),
+            ('month', date.replace(day=1)),
+            ('day', date)]
+
+
+class PostArchiveManager(models.Manager):
+    def update_counts(self, removed=None, added=None):
+        """
+        Поправляем количество статей в периодах, из которых статья с датой
+        публикации removed ушла и в которые статья с датой added попала.
+        """
+        deltas = Counter()
+        for publish, delta in ((removed, -1), (added, 1)):
+            if publish:
+                for archive in archive_periods(publish):
+                    deltas[archive] += delta
+        # Одинаковый порядок обновления строк во всех транзакциях.
+        changes = sorted(item for item in deltas.items() if item[1])
+        if not changes:
+            return
+
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        with transaction.atomic():
+            for (period, start), delta in changes:
+                if delta < 0:
+                    self.filter(period=period, start=start,
+                                total_posts__gte=-delta)\
+                        .update(total_posts=F('total_posts') + delta)
+            added_rows = [(period, start, delta)
+                          for (period, start), delta in changes if delta > 0]
+            if added_rows:
+                values = ', '.join(['(%s, %s, %s)'] * len(added_rows))
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'INSERT INTO {table} '
+                        f'(period, {quote("start")}, total_posts) '
+                        f'VALUES {values} '
+                        f'ON CONFLICT (period, {quote("start")}) '
+                        f'DO UPDATE SET total_posts = '
+                        f'{table}.total_posts + EXCLUDED.total_posts',
+                        [value for row in added_rows for value in row])
+            self.filter(total_posts=0).delete()
+
+    def rebuild(self):
+        """
+        Пересчитываем количество статей за каждый год, месяц и день целиком,
+        например после массового изменения статей через QuerySet.update().
+        """
+        with transaction.atomic():
+            archives = []
+            for period, trunc in (('year', TruncYear), ('month', TruncMonth),
+                                  ('day', TruncDay)):
+                # Усекаем в текущем часовом поясе, как и _period_range.
+                rows = Post.published.annotate(start=trunc('publish'))\
+                    .values('start').annotate(total_posts=Count('id'))\
+                    .order_by()
+                archives.extend(
+                    self.model(period=period,
+                               start=timezone.localtime(row['start']).date(),
+                               total_posts=row['total_posts'])
+                    for row in rows)
+            self.all().delete()
+            self.bulk_create(archives)
+
+
+class PostArchive(models.Model):
+    """ Количество опубликованных статей за год, месяц или день. """
+    PERIOD_CHOICES = (
+        ('year', 'Year'),
+        ('month', 'Month'),
+        ('day', 'Day'),
+    )
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # Первый день периода.
+    start = models.DateField()
+    total_posts = models.PositiveIntegerField(default=0)
+
+    objects = PostArchiveManager()
+
+    class Meta:
+        ordering = ('-start',)
+        unique_together = ('period', 'start')
+
+    def __str__(self) -> str:
+        return f'{self.period} {self.start}: {self.total_posts}'
+
+    def get_absolute_url(self):
+        args = [self.start.year, self.start.month, self.start.day]
+        if self.period == 'year':
+            return reverse('blog:post_archive_year', args=args[:1])
+        if self.period == 'month':
+            return reverse('blog:post_archive_month', args=args[:2])
+        return reverse('blog:post_archive_day', args=args)
+
+
+class PostViewCount(models.Model):
+    """
+    Количество просмотров статьи. Хранится отдельно от Post, чтобы запись
+    счетчиков не блокировала строки статей (см. blog.counters).
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name='view_count')
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.post}: {self.total} views'
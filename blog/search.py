@@ -0,0 +1,31 @@
+"""
+Кэш результатов поиска.
+
+Все ключи содержат версию, поэтому сбросить кэш целиком можно одной записью,
+например при изменении статьи (см. blog.signals).
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Сколько результатов поиска выводить на странице и сколько всего.
+SEARCH_RESULTS_PER_PAGE = getattr(settings, 'BLOG_SEARCH_RESULTS_PER_PAGE', 10)
+SEARCH_RESULTS_LIMIT = getattr(settings, 'BLOG_SEARCH_RESULTS_LIMIT', 100)
+SEARCH_CACHE_TIMEOUT = getattr(settings, 'BLOG_SEARCH_CACHE_TIMEOUT', 60 * 15)
+SEARCH_CACHE_VERSION_KEY = 'blog:search:version'
+
+
+def invalidate_search_cache():
+    """ Сбрасываем все закэшированные результаты поиска. """
+    cache.set(SEARCH_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def search_cache_key(kind, query):
+    """ Ключ кэша результатов поиска kind по нормализованному запросу. """
+    version = cache.get_or_set(SEARCH_CACHE_VERSION_KEY, uuid.uuid4().hex,
+                               None)
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f'blog:search:{version}:{kind}:{digest}'
@@ -0,0 +1,34 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Post, PostArchive
+from .search import invalidate_search_cache
+
+
+@receiver(pre_save, sender=Post)
+def remember_publish(sender, instance, **kwargs):
+    """ Запоминаем дату публикации статьи до сохранения. """
+    instance._published_before = None
+    if instance.pk:
+        instance._published_before = Post.published\
+            .filter(pk=instance.pk).values_list('publish', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    """
+    Изменение статьи делает устаревшими закэшированный поиск и количество
+    статей в архиве за старую и новую даты публикации.
+    """
+    invalidate_search_cache()
+    published = instance.publish if instance.status == 'published' else None
+    if published != instance._published_before:
+        PostArchive.objects.update_counts(
+            removed=instance._published_before, added=published)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    invalidate_search_cache()
+    if instance.status == 'published':
+        PostArchive.objects.update_counts(removed=instance.publish)
@@ -1,6 +1,8 @@
 import markdown
 
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count
 from django.utils.safestring import mark_safe
 
@@ -9,6 +11,9 @@ from ..models import Post
 
 register = template.Library()
 
+MOST_VIEWED_CACHE_TIMEOUT = getattr(settings,
+                                    'BLOG_MOST_VIEWED_CACHE_TIMEOUT', 60 * 5)
+
 
 @register.simple_tag
 def total_posts():
@@ -27,6 +32,18 @@ def get_most_commented_posts(count=5):
                          .order_by('-total_comments')[:count]
 
 
+@register.simple_tag
+def get_most_viewed_posts(count=5):
+    key = f'blog:most_viewed_posts:{count}'
+    posts = cache.get(key)
+    if posts is None:
+        posts = list(Post.published.filter(view_count__isnull=False)
+                                   .select_related('view_count')
+                                   .order_by('-view_count__total')[:count])
+        cache.set(key, posts, MOST_VIEWED_CACHE_TIMEOUT)
+    return posts
+
+
 @register.filter(name='markdown')
 def markdown_format(text):
     return mark_safe(markdown.markdown(text))
@@ -1,3 +1,383 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from django.db import connection, DatabaseError
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import counters
+from .management.commands import export_static
+from .management.commands.export_static import _url_to_path, \
+    _paginated_urls, _changed_states
+from .models import Post, PostArchive, PostViewCount, archive_periods
+from .templatetags.blog_tags import get_most_viewed_posts
+from .views import normalize_query, _highlight, _period_range
+
+
+class SearchTests(SimpleTestCase):
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  Django\tORM  Tips '),
+                         'django orm tips')
+
+    def test_highlight_escapes_body(self):
+        headline = '<script>x</script> [start]django[stop] <a href="'
+        self.assertEqual(_highlight(headline, '[start]', '[stop]'),
+                         '&lt;script&gt;x&lt;/script&gt; <b>django</b> '
+                         '&lt;a href=&quot;')
+
+
+# Полнотекстовый поиск и SearchHeadline работают только в PostgreSQL.
+@unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+@mock.patch('blog.views.SEARCH_RESULTS_LIMIT', 3)
+@mock.patch('blog.views.SEARCH_RESULTS_PER_PAGE', 2)
+class SearchViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}',
+                                author=author, status='published',
+                                body=f'a < b & Django tips {i}')
+            for i in range(5)]
+
+    def search(self, query, page=None):
+        params = {'query': query}
+        if page is not None:
+            params['page'] = page
+        return self.client.get(reverse('blog:post_search'), params)
+
+    def test_results_are_capped(self):
+        response = self.search('django')
+        results = response.context['results']
+        self.assertEqual(results.paginator.count, 3)
+        self.assertTrue(results.truncated)
+        self.assertEqual(len(results.object_list), 2)
+        self.assertContains(response, 'Found 3+ results')
+
+    def test_not_truncated_below_limit(self):
+        results = self.search('tips 4').context['results']
+        self.assertEqual(results.paginator.count, 1)
+        self.assertFalse(results.truncated)
+
+    def test_page_clamping(self):
+        self.assertEqual(self.search('django', 99).context['results'].number,
+                         2)
+        self.assertEqual(self.search('django', 'x').context['results'].number,
+                         1)
+        self.assertEqual(len(self.search('django', 2)
+                             .context['results'].object_list), 1)
+
+    def test_headline_is_escaped(self):
+        post = self.search('django').context['results'].object_list[0]
+        self.assertEqual(post.headline,
+                         f'a &lt; b &amp; <b>Django</b> tips {post.slug[-1]}')
+
+    def test_normalized_query_reuses_cache(self):
+        first = self.search('Django').context['results']
+        # update() не отправляет сигналов, поэтому кэш не сбрасывается.
+        Post.objects.update(title='Changed')
+        second = self.search('  DJANGO ').context['results']
+        self.assertEqual([post.title for post in second.object_list],
+                         [post.title for post in first.object_list])
+
+    def test_save_invalidates_cache(self):
+        self.search('tips 4')
+        post = self.posts[4]
+        post.body = 'nothing here'
+        post.save()
+        self.assertEqual(self.search('tips 4')
+                         .context['results'].paginator.count, 0)
+
+    def test_delete_invalidates_cache(self):
+        self.search('tips 4')
+        self.posts[4].delete()
+        self.assertEqual(self.search('tips 4')
+                         .context['results'].paginator.count, 0)
+
+
+class PeriodRangeTests(SimpleTestCase):
+    def assertRange(self, args, first, last):
+        start, end = _period_range(*args)
+        self.assertEqual((timezone.localtime(start), timezone.localtime(end)),
+                         (timezone.make_aware(datetime.datetime(*first)),
+                          timezone.make_aware(datetime.datetime(*last))))
+
+    def test_day(self):
+        self.assertRange((2020, 2, 29), (2020, 2, 29), (2020, 3, 1))
+        self.assertRange((2020, 12, 31), (2020, 12, 31), (2021, 1, 1))
+
+    def test_month(self):
+        self.assertRange((2021, 2), (2021, 2, 1), (2021, 3, 1))
+        self.assertRange((2020, 12), (2020, 12, 1), (2021, 1, 1))
+
+    def test_year(self):
+        self.assertRange((2020,), (2020, 1, 1), (2021, 1, 1))
+
+    def test_local_midnight(self):
+        with timezone.override('Europe/Moscow'):
+            start, end = _period_range(2020, 8, 8)
+        self.assertEqual(start.astimezone(datetime.timezone.utc),
+                         datetime.datetime(2020, 8, 7, 21,
+                                           tzinfo=datetime.timezone.utc))
+
+    def test_invalid_dates(self):
+        for args in ((2021, 2, 29), (2020, 13), (2020, 4, 31), (9999,),
+                     (0,)):
+            with self.subTest(args=args), self.assertRaises(Http404):
+                _period_range(*args)
+
+
+class PostArchiveTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+
+    def create_post(self, slug, publish, status='published'):
+        return Post.objects.create(title=slug, slug=slug, author=self.author,
+                                   body='body', publish=publish,
+                                   status=status)
+
+    def archive(self):
+        return set(PostArchive.objects.values_list('period', 'start',
+                                                   'total_posts'))
+
+    def test_archive_periods_use_current_time_zone(self):
+        publish = datetime.datetime(2020, 12, 31, 22,
+                                    tzinfo=datetime.timezone.utc)
+        with timezone.override('Europe/Moscow'):
+            self.assertEqual(archive_periods(publish),
+                             [('year', datetime.date(2021, 1, 1)),
+                              ('month', datetime.date(2021, 1, 1)),
+                              ('day', datetime.date(2021, 1, 1))])
+
+    def test_archive_page_uses_precomputed_count(self):
+        day = timezone.make_aware(datetime.datetime(2020, 8, 8, 12))
+        for i in range(4):
+            self.create_post(f'post-{i}', day)
+        url = reverse('blog:post_archive_month', args=[2020, 8])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': 2})
+
+        posts = response.context['posts']
+        self.assertEqual(posts.paginator.count, 4)
+        self.assertEqual((posts.number, len(posts.object_list)), (2, 1))
+        self.assertFalse([query['sql'] for query in queries
+                          if 'COUNT(' in query['sql'] and
+                          '"publish" >=' in query['sql']])
+
+    def test_signals_keep_archive_in_sync(self):
+        day = timezone.make_aware(datetime.datetime(2020, 8, 8, 12))
+        first = self.create_post('first', day)
+        second = self.create_post('second', day)
+        draft = self.create_post('draft', day, status='draft')
+        # Перенос статьи в другой месяц, снятие с публикации, удаление.
+        first.publish = day + datetime.timedelta(days=30)
+        first.save()
+        draft.status = 'published'
+        draft.save()
+        second.status = 'draft'
+        second.save()
+        draft.delete()
+
+        expected = self.archive()
+        PostArchive.objects.rebuild()
+        self.assertEqual(expected, self.archive())
+        self.assertEqual(expected,
+                         {('year', datetime.date(2020, 1, 1), 1),
+                          ('month', datetime.date(2020, 9, 1), 1),
+                          ('day', datetime.date(2020, 9, 7), 1)})
+
+
+class ExportStaticTests(SimpleTestCase):
+    def test_url_to_path(self):
+        self.assertEqual(_url_to_path('out', '/blog/2020/8/8/post/'),
+                         os.path.join('out', 'blog/2020/8/8/post/index.html'))
+        self.assertEqual(_url_to_path('out', '/blog/?page=2'),
+                         os.path.join('out', 'blog/page-2.html'))
+        self.assertEqual(_url_to_path('out', '/sitemaps.xml'),
+                         os.path.join('out', 'sitemaps.xml'))
+
+    def test_paginated_urls_prunes_stale_pages(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            list_dir = os.path.join(output_dir, 'blog')
+            os.makedirs(list_dir)
+            names = ['index.html', 'page-2.html', 'page-2.html.gz',
+                     'page-3.html', 'page-3.html.gz', 'page-10.html']
+            for name in names:
+                open(os.path.join(list_dir, name), 'w').close()
+
+            # 4 статьи - 2 страницы.
+            urls = _paginated_urls(output_dir, '/blog/', 4)
+
+            self.assertEqual(urls, ['/blog/', '/blog/?page=2'])
+            self.assertEqual(sorted(os.listdir(list_dir)),
+                             ['index.html', 'page-2.html', 'page-2.html.gz'])
+
+    def test_changed_states(self):
+        kept = {'url': '/kept/', 'updated': '1'}
+        previous = {'1': kept,
+                    '2': {'url': '/old-slug/', 'updated': '1'},
+                    '3': {'url': '/unpublished/', 'updated': '1'}}
+        posts = {'1': kept,
+                 '2': {'url': '/new-slug/', 'updated': '2'}}
+        stale = [previous['2'], previous['3']]
+
+        self.assertEqual(_changed_states(posts, previous, True),
+                         [posts['2']] + stale)
+        self.assertEqual(_changed_states(posts, previous, False),
+                         [kept, posts['2']] + stale)
+        self.assertEqual(_changed_states(posts, {}, True),
+                         [kept, posts['2']])
+
+
+class ExportStaticCommandTests(TestCase):
+    def test_jobs_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, '--jobs'):
+            call_command('export_static', 'out', jobs=0)
+
+    def test_view_error_is_reported_as_status(self):
+        with mock.patch.object(export_static, 'override_settings'):
+            export_static._init_worker('testserver')
+        with tempfile.TemporaryDirectory() as output_dir, \
+                mock.patch('blog.views.Paginator', side_effect=RuntimeError), \
+                self.assertLogs('django.request', 'ERROR'):
+            result = export_static._export_url(output_dir,
+                                               '/blog/function-views/')
+            self.assertEqual(result, ('/blog/function-views/', 500))
+            self.assertEqual(os.listdir(output_dir), [])
+
+
+@mock.patch.object(counters, 'MAX_PENDING', 3)
+@mock.patch.object(counters, '_start_flusher')
+class CountersTests(SimpleTestCase):
+    def setUp(self):
+        counters._pending.clear()
+        counters._pending_total = 0
+        counters._flusher_pid = None
+
+    def test_flush_when_max_pending_reached(self, start_flusher):
+        with mock.patch.object(counters, 'flush') as flush:
+            counters.record_view(1)
+            counters.record_view(2)
+            flush.assert_not_called()
+            counters.record_view(1)
+            flush.assert_called_once_with()
+        # Поток записи запускается один раз на процесс.
+        start_flusher.assert_called_once_with()
+
+    def test_flush_writes_sorted_rows(self, start_flusher):
+        counters._pending.update({2: 1, 1: 1})
+        counters._pending_total = 2
+        with mock.patch.object(counters, '_write') as write:
+            counters.flush()
+        write.assert_called_once_with([(1, 1), (2, 1)])
+        self.assertEqual(counters._pending_total, 0)
+        self.assertFalse(counters._pending)
+
+    def test_failed_flush_requeues_views(self, start_flusher):
+        counters._pending.update({1: 2})
+        counters._pending_total = 2
+        with mock.patch.object(counters, '_write',
+                               side_effect=DatabaseError), \
+                self.assertLogs(counters.logger) as logs:
+            counters.flush()
+        self.assertIn('2 views will be retried', logs.output[0])
+        self.assertEqual(counters._pending, {1: 2})
+        self.assertEqual(counters._pending_total, 2)
+
+    def test_failed_flush_drops_views_over_limit(self, start_flusher):
+        counters._pending.update({1: 2})
+        counters._pending_total = 2
+
+        def write(rows):
+            # Пока шла запись, в буфер попали новые просмотры.
+            counters._pending[2] += 2
+            counters._pending_total += 2
+            raise DatabaseError
+
+        with mock.patch.object(counters, '_write', side_effect=write), \
+                self.assertLogs(counters.logger) as logs:
+            counters.flush()
+        self.assertIn('2 views dropped', logs.output[0])
+        self.assertEqual(counters._pending, {2: 2})
+        self.assertEqual(counters._pending_total, 2)
+
+    def test_disabled(self, start_flusher):
+        with self.settings(BLOG_VIEWS_ENABLED=False):
+            counters.record_view(1)
+        self.assertFalse(counters._pending)
+
+    def test_flusher_loop_closes_connection(self, start_flusher):
+        stopped = mock.Mock()
+        stopped.wait.side_effect = [False, False, True]
+        with mock.patch.object(counters, '_stopped', stopped), \
+                mock.patch.object(counters, 'flush') as flush, \
+                mock.patch.object(counters, 'connection') as connection:
+            counters._flush_periodically()
+        stopped.wait.assert_called_with(counters.FLUSH_INTERVAL)
+        self.assertEqual(flush.call_count, 2)
+        self.assertEqual(connection.close.call_count, 2)
+
+
+class MostViewedPostsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}',
+                                author=author, body='body', status=status)
+            for i, status in enumerate(('published', 'published', 'draft',
+                                        'published'))]
+
+    def test_ordered_by_views_without_drafts(self):
+        for post, total in zip(self.posts, (5, 20, 50)):
+            PostViewCount.objects.create(post=post, total=total)
+        self.assertEqual(get_most_viewed_posts(),
+                         [self.posts[1], self.posts[0]])
+        self.assertEqual(get_most_viewed_posts(1), [self.posts[1]])
+
+
+# INSERT ... SELECT FROM (VALUES ...) AS v (...) ON CONFLICT - синтаксис
+# PostgreSQL.
+@unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+@mock.patch.object(counters, '_start_flusher')
+class CountersDatabaseTests(TestCase):
+    def setUp(self):
+        counters._pending.clear()
+        counters._pending_total = 0
+        counters._flusher_pid = None
+        author = User.objects.create(username='author')
+        self.first, self.second, self.deleted = [
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}',
+                                author=author, body='body',
+                                status='published')
+            for i in range(3)]
+
+    def totals(self):
+        return dict(PostViewCount.objects.values_list('post_id', 'total'))
+
+    def test_flush_adds_up_views(self, start_flusher):
+        for post_id in (self.first.id, self.second.id, self.first.id):
+            counters.record_view(post_id)
+        counters.flush()
+        counters.record_view(self.first.id)
+        counters.flush()
+        self.assertEqual(self.totals(), {self.first.id: 3,
+                                         self.second.id: 1})
+
+    def test_deleted_post_is_skipped(self, start_flusher):
+        counters.record_view(self.first.id)
+        counters.record_view(self.deleted.id)
+        self.deleted.delete()
+        counters.flush()
+        self.assertEqual(self.totals(), {self.first.id: 1})
+        self.assertFalse(counters._pending)
@@ -9,6 +9,11 @@ urlpatterns = [
     # post views
     path('', views.PostListView.as_view(), name='post_list_cbv'),
     path('function-views/', views.post_list, name='post_list'),
+    path('<int:year>/', views.post_archive, name='post_archive_year'),
+    path('<int:year>/<int:month>/', views.post_archive,
+         name='post_archive_month'),
+    path('<int:year>/<int:month>/<int:day>/', views.post_archive,
+         name='post_archive_day'),
     path('<int:year>/<int:month>/<int:day>/<slug:post>/',
          views.post_detail, name='post_detail'),
     path('<int:post_id>/share/', views.post_share, name='post_share'),
@@ -1,15 +1,61 @@
+import datetime
+import uuid
+
 from django.contrib.postgres.search import SearchVector, SearchQuery, \
-    SearchRank, TrigramSimilarity
+    SearchRank, TrigramSimilarity, SearchHeadline
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.mail import send_mail
 from django.db.models import Count
+from django.http import Http404
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView
 from django.shortcuts import render, get_object_or_404
 
 from taggit.models import Tag
 
-from .models import Post, Comment
+from .counters import record_view
+from .models import Post, Comment, PostArchive
 from .forms import EmailPostForm, CommentForm, SearchForm
+from .search import SEARCH_RESULTS_PER_PAGE, SEARCH_RESULTS_LIMIT, \
+    SEARCH_CACHE_TIMEOUT, search_cache_key
+
+
+POSTS_PER_PAGE = 3  # По 3 статьи на каждой странице
+
+
+def _get_page(paginator, page):
+    """ Возвращаем страницу paginator'а по номеру из запроса. """
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        # Если страница не является целым числом, возвращаем первую страницу.
+        return paginator.page(1)
+    except EmptyPage:
+        # Если номер страницы больше, чем общее кол-во страниц,
+        # возвращаем последнюю страницу.
+        return paginator.page(paginator.num_pages)
+
+
+def _period_range(year, month=None, day=None):
+    """
+    Возвращаем границы [start, end) года, месяца или дня в текущем часовом
+    поясе. В отличие от publish__year и т.п. такой фильтр использует индекс.
+    """
+    try:
+        first = datetime.date(year, month or 1, day or 1)
+        if day:
+            last = first + datetime.timedelta(days=1)
+        elif month:
+            last = (first + datetime.timedelta(days=31)).replace(day=1)
+        else:
+            last = first.replace(year=year + 1)
+    except (ValueError, OverflowError):
+        raise Http404('Invalid date')
+    return tuple(timezone.make_aware(datetime.datetime.combine(
+        date, datetime.time())) for date in (first, last))
 
 
 def post_list(request, tag_slug=None):
@@ -20,27 +66,46 @@ def post_list(request, tag_slug=None):
         tag = get_object_or_404(Tag, slug=tag_slug)
         object_list = object_list.filter(tags__in=[tag])
 
-    paginator = Paginator(object_list, 3)  # По 3 статьи на каждой странице
+    paginator = Paginator(object_list, POSTS_PER_PAGE)
     page = request.GET.get('page')
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        # Если страница не является целым числом, возвращаем первую страницу.
-        posts = paginator.page(1)
-    except EmptyPage:
-        # Если номер страницы больше, чем общее кол-во страниц,
-        # возвращаем последнюю страницу.
-        posts = paginator.page(paginator.num_pages)
+    posts = _get_page(paginator, page)
     return render(request, 'blog/post/list.html', {'page': page,
                                                    'posts': posts,
                                                    'tag': tag})
 
 
+def post_archive(request, year, month=None, day=None):
+    """ Выводим статьи, опубликованные за год, месяц или день. """
+    start, end = _period_range(year, month, day)
+    period = 'day' if day else 'month' if month else 'year'
+    # Количество статей берем из заранее посчитанной таблицы архива.
+    archive = get_object_or_404(PostArchive, period=period,
+                                start=start.date())
+    # Разбивка года по месяцам и месяца по дням.
+    sub_archives = []
+    if period != 'day':
+        sub_archives = PostArchive.objects.filter(
+            period='month' if period == 'year' else 'day',
+            start__gte=start.date(), start__lt=end.date())
+
+    object_list = Post.published.filter(publish__gte=start, publish__lt=end)
+    paginator = Paginator(object_list, POSTS_PER_PAGE)
+    # Без лишнего SELECT COUNT(*): количество уже есть в архиве.
+    paginator.count = archive.total_posts
+    posts = _get_page(paginator, request.GET.get('page'))
+    return render(request, 'blog/post/archive.html',
+                  {'archive': archive,
+                   'sub_archives': sub_archives,
+                   'posts': posts})
+
+
 def post_detail(request, year, month, day, post):
     """ Выводим подробную информацию о статье. """
+    start, end = _period_range(year, month, day)
     post = get_object_or_404(Post, slug=post, status='published',
-                             publish__year=year, publish__month=month,
-                             publish__day=day)
+                             publish__gte=start, publish__lt=end)
+    if request.method == 'GET':
+        record_view(post.id)
     # Список активных комментариев для данной статьи
     comments = Comment.objects.filter(active=True)
     new_comment = None
@@ -89,7 +154,7 @@ class PostListView(ListView):
     # queryset вместо model, чтобы использовать свой менеджер published
     queryset = Post.published.all()
     context_object_name = 'posts'  # иначе будет object_list
-    paginate_by = 3  # ListView передает в контекст page_obj
+    paginate_by = POSTS_PER_PAGE  # ListView передает в контекст page_obj
     template_name = 'blog/post/list_cbv.html'
 
 
@@ -118,6 +183,64 @@ def post_share(request, post_id):
                                                     'sent': sent})
 
 
+def normalize_query(query):
+    """
+    Приводим поисковый запрос к единому виду: "Django  ORM" -> "django orm".
+    """
+    return ' '.join(query.lower().split())
+
+
+def _highlight(headline, start_sel, stop_sel):
+    """ Экранируем фрагмент статьи и выделяем в нем найденные слова. """
+    return mark_safe(escape(headline).replace(start_sel, '<b>')
+                                     .replace(stop_sel, '</b>'))
+
+
+def _search_page(request, kind, query, results):
+    """
+    Возвращаем запрошенную страницу результатов поиска.
+
+    results - отсортированный по релевантности QuerySet. Ранжирование
+    выполняется один раз на запрос: в кэш кладутся id первых
+    SEARCH_RESULTS_LIMIT статей, а для каждой страницы - только ее статьи
+    с подсвеченными фрагментами текста (headline).
+    """
+    key = search_cache_key(kind, query)
+    cached = cache.get(key)
+    if cached is None:
+        # Одна лишняя запись показывает, что результаты обрезаны.
+        post_ids = list(results.values_list('id', flat=True)
+                        [:SEARCH_RESULTS_LIMIT + 1])
+        cached = (post_ids[:SEARCH_RESULTS_LIMIT],
+                  len(post_ids) > SEARCH_RESULTS_LIMIT)
+        cache.set(key, cached, SEARCH_CACHE_TIMEOUT)
+    post_ids, truncated = cached
+
+    paginator = Paginator(post_ids, SEARCH_RESULTS_PER_PAGE)
+    page = _get_page(paginator, request.GET.get('page'))
+    page.truncated = truncated
+    page_key = f'{key}:{page.number}'
+    posts = cache.get(page_key)
+    if posts is None:
+        page_ids = list(page.object_list)
+        # Фрагмент - это кусок исходного body, поэтому найденные слова
+        # отмечаем случайными строками и заменяем их на <b> и </b> уже
+        # после экранирования.
+        start_sel, stop_sel = uuid.uuid4().hex, uuid.uuid4().hex
+        # Тело статьи целиком не загружаем, из него берется только фрагмент.
+        posts = Post.objects.filter(id__in=page_ids)\
+            .only('title', 'slug', 'publish')\
+            .annotate(headline=SearchHeadline('body', SearchQuery(query),
+                                              start_sel=start_sel,
+                                              stop_sel=stop_sel))
+        posts = sorted(posts, key=lambda post: page_ids.index(post.id))
+        for post in posts:
+            post.headline = _highlight(post.headline, start_sel, stop_sel)
+        cache.set(page_key, posts, SEARCH_CACHE_TIMEOUT)
+    page.object_list = posts
+    return page
+
+
 def post_search(request):
     form = SearchForm()
     query = None
@@ -125,7 +248,7 @@ def post_search(request):
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
-            query = form.cleaned_data['query']
+            query = normalize_query(form.cleaned_data['query'])
             # Мы можем повысить значимость некоторых векторов, чтобы
             # совпадения по ним считались более релевантными, чем по
             # остальным. Например, можно на- строить поиск так, чтобы статьи с
@@ -143,6 +266,7 @@ def post_search(request):
                 .filter(similarity__gte=0.3).order_by('-similarity')
                 # .filter(rank__gte=0.3).order_by('-rank')
                 # .filter(search=search_query).order_by('-rank')
+            results = _search_page(request, 'trigram', query, results)
     return render(request, 'blog/post/search.html', {'form': form,
                                                      'query': query,
                                                      'results': results})
@@ -156,10 +280,11 @@ def post_search_simple(request):
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
-            query = form.cleaned_data['query']
+            query = normalize_query(form.cleaned_data['query'])
             results = Post.objects.annotate(
                 search=SearchVector('title', 'body'),)\
                 .filter(search=query)
+            results = _search_page(request, 'simple', query, results)
     return render(request, 'blog/post/search.html', {'form': form,
                                                      'query': query,
                                                      'results': results})
@@ -173,13 +298,14 @@ def post_search_rank(request):
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
-            query = form.cleaned_data['query']
+            query = normalize_query(form.cleaned_data['query'])
             search_vector = SearchVector('title', 'body')
             search_query = SearchQuery(query)
             results = Post.objects.annotate(
                 search=search_vector,
                 rank=SearchRank(search_vector, search_query))\
                 .filter(search=search_query).order_by('-rank')
+            results = _search_page(request, 'rank', query, results)
     return render(request, 'blog/post/search.html', {'form': form,
                                                      'query': query,
                                                      'results': results})
@@ -192,7 +318,7 @@ def post_search_weight(request):
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
-            query = form.cleaned_data['query']
+            query = normalize_query(form.cleaned_data['query'])
             # Мы можем повысить значимость некоторых векторов, чтобы
             # совпадения по ним считались более релевантными, чем по
             # остальным. Например, можно на- строить поиск так, чтобы статьи с
@@ -211,6 +337,7 @@ def post_search_weight(request):
             # вес 1.0 для вектора по полю title и 0.4 – для век- тора по полю
             # body. В конце отбрасываем статьи с низким рангом и показываем
             # только те, чей ранг выше 0.3.
+            results = _search_page(request, 'weight', query, results)
     return render(request, 'blog/post/search.html', {'form': form,
                                                      'query': query,
                                                      'results': results})
@@ -223,10 +350,11 @@ def post_search_trigram_similarity(request):
     if 'query' in request.GET:
         form = SearchForm(request.GET)
         if form.is_valid():
-            query = form.cleaned_data['query']
+            query = normalize_query(form.cleaned_data['query'])
             results = Post.objects.annotate(
                 similarity=TrigramSimilarity('title', query))\
                 .filter(similarity__gte=0.3).order_by('-similarity')
+            results = _search_page(request, 'trigram', query, results)
     return render(request, 'blog/post/search.html', {'form': form,
                                                      'query': query,
                                                      'results': results})